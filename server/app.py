@@ -4,9 +4,13 @@ from schemas import ImpressionEvent, ClickEvent
 from store import InMemoryStore
 from model import OnlineModel
 from fastapi.middleware.cors import CORSMiddleware
-from google_suggest_seeder import load_cache, save_cache, fetch_google_suggestions,seed_google_suggestions
+from google_suggest_seeder import load_cache, save_cache, fetch_google_suggestions_async,seed_google_suggestions_async
 from datetime import datetime, timezone
+import asyncio
+import httpx
 import trainer
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 
 app = FastAPI()
 
@@ -24,11 +28,53 @@ app.add_middleware(
 )
 
 # Global in-memory components
-store = InMemoryStore()
 model = OnlineModel()
+store = InMemoryStore(vectorizer=model.vectorizer)
+
+# Single dedicated scoring thread: keeps sklearn work off the event loop and
+# makes the model's reusable scratch buffers safe without locking
+score_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scorer')
+
+# Coalescing for cold-prefix Google fetches: hot prefixes hit the TTL cache,
+# concurrent misses for the same prefix share a single in-flight fetch.
+google_cache = TTLCache(maxsize=1024, ttl=300)
+inflight: dict = {}  # prefix -> asyncio.Future
+
+async def _get_google_suggestions(prefix: str):
+    cached = google_cache.get(prefix)
+    if cached is not None:
+        return cached
+    fut = inflight.get(prefix)
+    if fut is None:
+        # run the fetch in its own task so the request that started it
+        # disconnecting cannot cancel it out from under the coalesced waiters
+        fut = asyncio.get_running_loop().create_future()
+        inflight[prefix] = fut
+        asyncio.create_task(_fill_google_suggestions(prefix, fut))
+    # shield: cancelling any one waiter must not cancel the shared future
+    return await asyncio.shield(fut)
+
+async def _fill_google_suggestions(prefix: str, fut: asyncio.Future):
+    try:
+        suggestions = await fetch_google_suggestions_async(app.state.http, prefix)
+        google_cache[prefix] = suggestions
+        fut.set_result(suggestions)
+    except BaseException as e:
+        # resolve the future on every exit (cancellation included) so
+        # waiters are never left pending
+        if isinstance(e, asyncio.CancelledError):
+            fut.cancel()
+        else:
+            fut.set_exception(e)
+        raise
+    finally:
+        inflight.pop(prefix, None)
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
+    # Shared HTTP client for Google Suggest fetches (connection reuse, async)
+    app.state.http = httpx.AsyncClient(timeout=5.0)
+
     # Start background trainer with references to store and model
     trainer.start_trainer(store, model)
 
@@ -59,28 +105,39 @@ def on_startup():
         store.add_query(q, increment=5)
 
     # ---- SEED GOOGLE SUGGESTIONS ----
-    seed_google_suggestions(
+    # runs in the background so startup doesn't wait on the network;
+    # cold-cache prefixes are fetched concurrently
+    asyncio.create_task(seed_google_suggestions_async(
         store,
+        app.state.http,
         prefixes=["leave", "salary", "policy", "how to", "request", "id card"],
         increment=2,
         ttl_days=7,
         max_size=1000
-    )
+    ))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await app.state.http.aclose()
+    score_executor.shutdown(wait=False)
 
 @app.get('/suggest')
-def suggest(prefix: str = '', k: int = 10):
+async def suggest(prefix: str = '', k: int = 10):
+    # normalize raw input once here; store and model work on normalized strings
+    prefix = prefix.strip().lower()
     candidates = store.get_prefix_candidates(prefix, limit=50) if prefix else store.get_top_n(limit=50)
     if not candidates:
-        google_suggestions = fetch_google_suggestions(prefix)
+        google_suggestions = await _get_google_suggestions(prefix)
         for s in google_suggestions:
             store.add_query(s, increment=1)
-        candidates = google_suggestions
-    pairs = model.score_candidates(prefix, candidates, store)
-    top = pairs[:k]
+        candidates = [s.strip().lower() for s in google_suggestions]
+    # sklearn scoring is CPU-bound; run it on the dedicated scorer thread
+    top = await asyncio.get_running_loop().run_in_executor(
+        score_executor, model.score_candidates, prefix, candidates, store, k)
     return {"suggestions": [{"text": p, "score": float(s)} for p, s in top]}
 
 @app.post('/log_event')
-def log_event(ev: dict):
+async def log_event(ev: dict):
     ev_type = ev.get('type')
     if ev_type not in ('impression', 'click'):
         raise HTTPException(status_code=400, detail='type must be impression or click')
@@ -3,10 +3,12 @@
 Google Suggest Seeder with robust file cache
 -------------------------------------------
 Features implemented:
-  - cache stored in ./cache/google_suggest_cache.json
+  - cache persisted as a msgpack snapshot (./cache/google_suggest_cache.bin)
+    plus an append-only log (.log) so refreshing one prefix writes one record
+    instead of rewriting the whole cache; legacy JSON caches are migrated on load
   - per-prefix fetched_at timestamp and TTL-based expiration (default 7 days)
   - max-size limit for cache (default 1000 prefixes) with eviction of oldest entries
-  - atomic writes to avoid corruption
+  - atomic snapshot writes to avoid corruption
   - optional force refresh flag
   - safe fallbacks when network calls fail
 
@@ -17,21 +19,25 @@ Usage:
 You can customize TTL, max_size, cache_dir, prefixes, increment, and force_refresh.
 """
 
-import json
+import asyncio
 import os
 import time
+from collections import OrderedDict
+
+import msgpack
+import orjson
 from pathlib import Path
-from datetime import datetime, timezone, timedelta
+from datetime import datetime
 import requests
 
 
 DEFAULT_CACHE_DIR = Path("./cache")
 DEFAULT_CACHE_FILE = "google_suggest_cache.json"
 GOOGLE_URL = "https://suggestqueries.google.com/complete/search"
-
-
-def _now_utc_iso():
-    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+DEFAULT_PREFIXES = [
+    "leave", "salary", "id card", "how to", "work from home",
+    "holiday", "hr policy", "it support", "expense", "travel reimbursement",
+]
 
 
 def _parse_iso(ts: str):
@@ -47,6 +53,18 @@ def _parse_iso(ts: str):
         return None
 
 
+def _to_epoch(ts):
+    """Coerce a fetched_at value to a Unix epoch float (0.0 when unknown).
+    Legacy caches stored ISO strings; new entries store floats directly."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        dt = _parse_iso(ts)
+        if dt is not None:
+            return dt.timestamp()
+    return 0.0
+
+
 def _ensure_cache_dir(cache_dir: Path):
     cache_dir.mkdir(parents=True, exist_ok=True)
 
@@ -56,38 +74,126 @@ def get_cache_path(cache_dir: Path = DEFAULT_CACHE_DIR, cache_file: str = DEFAUL
     return cache_dir / cache_file
 
 
+def _snapshot_path(cache_dir: Path, cache_file: str) -> Path:
+    return get_cache_path(cache_dir, cache_file).with_suffix('.bin')
+
+
+def _log_path(cache_dir: Path, cache_file: str) -> Path:
+    return get_cache_path(cache_dir, cache_file).with_suffix('.log')
+
+
+# append-only log handles, opened lazily once per process
+_log_handles = {}
+
+
+def _get_log_handle(path: Path):
+    f = _log_handles.get(path)
+    if f is None or f.closed:
+        f = open(path, 'ab', buffering=65536)
+        _log_handles[path] = f
+    return f
+
+
+def _close_log_handle(path: Path):
+    f = _log_handles.pop(path, None)
+    if f is not None and not f.closed:
+        try:
+            f.close()
+        except Exception:
+            pass
+
+
 def load_cache(cache_dir: Path = DEFAULT_CACHE_DIR, cache_file: str = DEFAULT_CACHE_FILE):
-    path = get_cache_path(cache_dir, cache_file)
-    if not path.exists():
-        return {}
+    """Load the snapshot, replay the append-only log on top, and fall back to
+    a legacy JSON cache file for one-time migration."""
+    cache = {}
+    snap = _snapshot_path(cache_dir, cache_file)
+    legacy = get_cache_path(cache_dir, cache_file)
     try:
-        with path.open('r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Validate shape: prefix -> {"suggestions": [...], "fetched_at": "..."}
-            if not isinstance(data, dict):
-                return {}
-            return data
+        if snap.exists():
+            with open(snap, 'rb', buffering=65536) as f:
+                data = msgpack.unpackb(f.read(), raw=False)
+            if isinstance(data, dict):
+                cache = data
+        elif legacy.exists():
+            # legacy JSON cache from older versions; migrated on next snapshot
+            with open(legacy, 'rb', buffering=65536) as f:
+                data = orjson.loads(f.read())
+            if isinstance(data, dict):
+                cache = data
     except Exception:
         # fallback to empty cache on parse/read errors
-        return {}
+        cache = {}
+    # replay log records written since the last snapshot
+    log = _log_path(cache_dir, cache_file)
+    if log.exists():
+        try:
+            with open(log, 'rb', buffering=65536) as f:
+                for rec in msgpack.Unpacker(f, raw=False):
+                    if isinstance(rec, dict) and rec.get('op') == 'put':
+                        cache[rec['prefix']] = {
+                            'suggestions': rec.get('suggestions', []),
+                            'fetched_at': rec.get('ts'),
+                        }
+        except Exception:
+            # a torn trailing record just means we stop replaying there
+            pass
+    # one-time migration: legacy ISO timestamps become epoch floats so the
+    # TTL/eviction paths can compare numbers instead of parsing datetimes
+    for entry in cache.values():
+        if isinstance(entry, dict) and isinstance(entry.get('fetched_at'), str):
+            entry['fetched_at'] = _to_epoch(entry['fetched_at'])
+    # keep entries ordered oldest-first; refreshes move_to_end, so eviction
+    # is popitem(last=False) instead of a full sort
+    return OrderedDict(sorted(
+        cache.items(),
+        key=lambda kv: _to_epoch(kv[1].get('fetched_at')) if isinstance(kv[1], dict) else 0.0))
+
+
+def append_cache_record(prefix: str, entry: dict,
+                        cache_dir: Path = DEFAULT_CACHE_DIR, cache_file: str = DEFAULT_CACHE_FILE):
+    """Append a single refreshed entry to the log; O(record), not O(cache)."""
+    record = {'op': 'put', 'prefix': prefix,
+              'suggestions': entry.get('suggestions', []), 'ts': entry.get('fetched_at')}
+    try:
+        f = _get_log_handle(_log_path(cache_dir, cache_file))
+        f.write(msgpack.packb(record))
+        f.flush()
+    except Exception:
+        # best-effort: a lost log record only costs a re-fetch later
+        pass
 
 
 def save_cache(cache: dict, cache_dir: Path = DEFAULT_CACHE_DIR, cache_file: str = DEFAULT_CACHE_FILE):
-    path = get_cache_path(cache_dir, cache_file)
+    """Write a full snapshot and truncate the log it supersedes."""
+    path = _snapshot_path(cache_dir, cache_file)
     tmp = path.with_suffix('.tmp')
+    payload = msgpack.packb(cache)
     try:
-        with tmp.open('w', encoding='utf-8') as f:
-            json.dump(cache, f, indent=2, ensure_ascii=False)
+        with open(tmp, 'wb', buffering=65536) as f:
+            f.write(payload)
         # atomic replace
         os.replace(tmp, path)
     except Exception:
         # best-effort: try direct write
         try:
-            with path.open('w', encoding='utf-8') as f:
-                json.dump(cache, f, indent=2, ensure_ascii=False)
+            with open(path, 'wb', buffering=65536) as f:
+                f.write(payload)
         except Exception:
             # silently ignore write failures to avoid breaking startup
-            pass
+            return
+    # snapshot now covers everything in the log
+    log = _log_path(cache_dir, cache_file)
+    _close_log_handle(log)
+    try:
+        open(log, 'wb').close()
+    except Exception:
+        pass
+
+
+# shared session so keep-alive amortizes the TCP+TLS handshake across calls
+_SESSION = requests.Session()
+_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=20))
 
 
 def fetch_google_suggestions(query: str, max_retries: int = 2, timeout: float = 5.0):
@@ -96,7 +202,7 @@ def fetch_google_suggestions(query: str, max_retries: int = 2, timeout: float =
     last_exc = None
     for attempt in range(max_retries + 1):
         try:
-            resp = requests.get(GOOGLE_URL, params=params, timeout=timeout)
+            resp = _SESSION.get(GOOGLE_URL, params=params, timeout=timeout)
             if resp.status_code == 200:
                 data = resp.json()
                 if isinstance(data, list) and len(data) > 1 and isinstance(data[1], list):
@@ -111,33 +217,39 @@ def fetch_google_suggestions(query: str, max_retries: int = 2, timeout: float =
     return []
 
 
-def _is_expired(fetched_at_iso: str, ttl_days: int) -> bool:
-    if not fetched_at_iso:
-        return True
-    dt = _parse_iso(fetched_at_iso)
-    if not dt:
+async def fetch_google_suggestions_async(client, query: str, max_retries: int = 2):
+    """Async variant of fetch_google_suggestions using a shared httpx.AsyncClient
+    (timeout is configured on the client)."""
+    params = {"client": "firefox", "q": query}
+    for attempt in range(max_retries + 1):
+        try:
+            resp = await client.get(GOOGLE_URL, params=params)
+            if resp.status_code == 200:
+                data = resp.json()
+                if isinstance(data, list) and len(data) > 1 and isinstance(data[1], list):
+                    return [s for s in data[1] if isinstance(s, str)]
+            # non-200 or unexpected shape -> return empty to avoid seeding bad data
+            return []
+        except Exception:
+            # simple backoff
+            await asyncio.sleep(0.3 * (attempt + 1))
+    # all retries failed -> return empty
+    return []
+
+
+def _is_expired(fetched_at, ttl_days: int) -> bool:
+    if not fetched_at:
         return True
-    return datetime.now(timezone.utc) - dt > timedelta(days=ttl_days)
+    return time.time() - _to_epoch(fetched_at) > ttl_days * 86400
 
 
-def _evict_if_needed(cache: dict, max_size: int):
-    """Evict oldest entries until cache size <= max_size."""
+def _evict_if_needed(cache: OrderedDict, max_size: int):
+    """Evict oldest entries until cache size <= max_size; O(evicted) since the
+    OrderedDict keeps entries oldest-first."""
     if max_size is None or max_size <= 0:
         return cache
-    if len(cache) <= max_size:
-        return cache
-    # build list of (prefix, fetched_at_datetime)
-    items = []
-    for k, v in cache.items():
-        fa = v.get('fetched_at') if isinstance(v, dict) else None
-        dt = _parse_iso(fa) or datetime.fromtimestamp(0, timezone.utc)
-        items.append((k, dt))
-    # sort by oldest first
-    items.sort(key=lambda x: x[1])
-    to_remove = len(cache) - max_size
-    for i in range(to_remove):
-        key = items[i][0]
-        cache.pop(key, None)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
     return cache
 
 
@@ -163,14 +275,10 @@ def seed_google_suggestions(store,
         force_refresh: if True, ignore TTL and re-fetch all prefixes
     """
     if prefixes is None:
-        prefixes = [
-            "leave", "salary", "id card", "how to", "work from home",
-            "holiday", "hr policy", "it support", "expense", "travel reimbursement",
-        ]
+        prefixes = DEFAULT_PREFIXES
 
     cache_dir = Path(cache_dir)
     cache = load_cache(cache_dir, cache_file)
-    updated = False
     seeded_count = 0
 
     for p in prefixes:
@@ -184,11 +292,14 @@ def seed_google_suggestions(store,
         else:
             # Fetch from Google and update cache entry
             suggestions = fetch_google_suggestions(key)
-            cache[key] = {
+            entry = {
                 'suggestions': suggestions,
-                'fetched_at': _now_utc_iso()
+                'fetched_at': time.time()
             }
-            updated = True
+            cache[key] = entry
+            cache.move_to_end(key)  # newest entries sit at the LRU tail
+            # one log record per refresh instead of rewriting the whole cache
+            append_cache_record(key, entry, cache_dir, cache_file)
 
         # Seed into store (do not crash if store fails)
         for s in suggestions:
@@ -199,10 +310,67 @@ def seed_google_suggestions(store,
                 # ignore failures from store
                 pass
 
-    # Evict if cache too big
+    # Evict if cache too big; eviction invalidates log records, so snapshot
+    before = len(cache)
     cache = _evict_if_needed(cache, max_size)
+    if len(cache) < before:
+        save_cache(cache, cache_dir, cache_file)
+
+    print(f"[GoogleSeeder] Seeded {seeded_count} suggestions for {len(prefixes)} prefixes. cache_size={len(cache)}")
 
-    if updated:
+
+async def seed_google_suggestions_async(store,
+                                        client,
+                                        prefixes=None,
+                                        increment: int = 2,
+                                        cache_dir: Path = DEFAULT_CACHE_DIR,
+                                        cache_file: str = DEFAULT_CACHE_FILE,
+                                        ttl_days: int = 7,
+                                        max_size: int = 1000,
+                                        force_refresh: bool = False):
+    """Async variant of seed_google_suggestions: missing/expired prefixes are
+    fetched concurrently with asyncio.gather on a shared httpx.AsyncClient, so
+    cold-cache seeding costs one round-trip instead of one per prefix."""
+    if prefixes is None:
+        prefixes = DEFAULT_PREFIXES
+
+    cache_dir = Path(cache_dir)
+    cache = load_cache(cache_dir, cache_file)
+    seeded_count = 0
+
+    keys = list(dict.fromkeys(p.lower().strip() for p in prefixes))
+    to_fetch = [k for k in keys
+                if force_refresh or k not in cache
+                or _is_expired(cache.get(k, {}).get('fetched_at'), ttl_days)]
+
+    if to_fetch:
+        results = await asyncio.gather(
+            *(fetch_google_suggestions_async(client, k) for k in to_fetch))
+        for key, suggestions in zip(to_fetch, results):
+            entry = {
+                'suggestions': suggestions,
+                'fetched_at': time.time()
+            }
+            cache[key] = entry
+            cache.move_to_end(key)  # newest entries sit at the LRU tail
+            append_cache_record(key, entry, cache_dir, cache_file)
+
+    for key in keys:
+        entry = cache.get(key, {})
+        suggestions = entry.get('suggestions', []) if isinstance(entry, dict) else []
+        # Seed into store (do not crash if store fails)
+        for s in suggestions:
+            try:
+                store.add_query(s, increment=increment)
+                seeded_count += 1
+            except Exception:
+                # ignore failures from store
+                pass
+
+    # Evict if cache too big; eviction invalidates log records, so snapshot
+    before = len(cache)
+    cache = _evict_if_needed(cache, max_size)
+    if len(cache) < before:
         save_cache(cache, cache_dir, cache_file)
 
     print(f"[GoogleSeeder] Seeded {seeded_count} suggestions for {len(prefixes)} prefixes. cache_size={len(cache)}")
@@ -211,7 +379,10 @@ def seed_google_suggestions(store,
 # __all__ exports
 __all__ = [
     'seed_google_suggestions',
+    'seed_google_suggestions_async',
     'fetch_google_suggestions',
+    'fetch_google_suggestions_async',
     'load_cache',
-    'save_cache'
+    'save_cache',
+    'append_cache_record'
 ]
@@ -1,46 +1,141 @@
-# Defines an OnlineModel wrapper containing a HashingVectorizer and an SGDClassifier for partial_fit.
+# Defines an OnlineModel wrapper containing a token-hashing vectorizer and an SGDClassifier for partial_fit.
 # Provides functions to compute feature matrices and score candidates.
 
-from sklearn.feature_extraction.text import HashingVectorizer
+import functools
+from collections import Counter
+
+import mmh3
 from sklearn.linear_model import SGDClassifier
 from scipy import sparse
 import numpy as np
 
+
+class TokenHashVectorizer:
+    """Drop-in replacement for HashingVectorizer(alternate_sign=False,
+    norm=None) on this workload: lowercase, whitespace-split, and bucket each
+    token with MurmurHash3 (compiled) instead of sklearn's regex tokenizer and
+    Python-level hashing. Stateless and additive in token counts, which the
+    query/candidate row combination in _text_matrix relies on."""
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self._mask = n_features - 1  # n_features must be a power of two
+
+    def transform(self, texts):
+        mask = self._mask
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            counts = Counter(mmh3.hash(tok, signed=False) & mask
+                             for tok in text.lower().split())
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        X = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64),
+             np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int32)),
+            shape=(len(texts), self.n_features))
+        X.sort_indices()
+        return X
+
+
 class OnlineModel:
     def __init__(self):
-        self.vectorizer = HashingVectorizer(n_features=2 ** 18, alternate_sign=False, norm=None)
+        self.vectorizer = TokenHashVectorizer(n_features=2 ** 18)
         self.model = SGDClassifier(loss='log_loss', penalty='l2', max_iter=1, warm_start=True)
         # initialize model classes
         dummy = self.vectorizer.transform(["init"])
         dummy = sparse.hstack([dummy, sparse.csr_matrix([[0.0]])])
         self.model.partial_fit(dummy, np.array([0]), classes=np.array([0, 1]))
+        # single-text vector cache: queries and candidates repeat heavily
+        # across suggest requests, and the vectorizer is stateless
+        self._vec_single = functools.lru_cache(maxsize=1024)(self._transform_one)
+        # reusable scratch for the popularity column; scoring runs on a single
+        # dedicated thread, so reuse is safe and avoids per-request allocation
+        self._pops_buf = np.empty(512, dtype=np.float32)
+        # guard against accidental thread fan-out inside decision_function
+        self.model.n_jobs = 1
+        # weight snapshot for manual scoring, refreshed lazily after each fit
+        self._fit_count = 1
+        self._snap_version = -1
+        self._w_text = None
+        self._w_pop = 0.0
+        self._b = 0.0
+
+    def _transform_one(self, text: str):
+        return self.vectorizer.transform([text])
+
+    def _text_matrix(self, query: str, candidates: list, store):
+        # The vectorizer is additive in token counts, so hashing
+        # f"{query} {cand}" equals hashing each part separately and summing
+        # rows. Hash the query once per request instead of once per
+        # candidate, and reuse cached candidate rows.
+        X_q = self._vec_single(query)
+        rows = []
+        for c in candidates:
+            # candidates usually come from the store, which pre-hashed them
+            row = store.vec_row.get(c)
+            if row is None:
+                row = self._vec_single(c)
+            rows.append(row)
+        X_c = sparse.vstack(rows, format='csr')
+        return X_c + sparse.vstack([X_q] * len(candidates), format='csr')
+
+    def _pop_column(self, candidates: list, store):
+        # vectorized popularity column; candidates arrive normalized
+        n = len(candidates)
+        scores = np.fromiter((store.pop.get(c, 0) for c in candidates),
+                             dtype=np.float32, count=n)
+        buf = self._pops_buf[:n] if n <= self._pops_buf.size else np.empty(n, dtype=np.float32)
+        np.log1p(scores, out=buf)
+        return buf
+
+    def _refresh_weights(self):
+        # snapshot coef_ split into text weights / popularity weight / bias so
+        # scoring never has to hstack the feature blocks; the copy also keeps
+        # the scorer thread consistent while the trainer updates coef_ in place
+        if self._snap_version != self._fit_count:
+            w = self.model.coef_.ravel()
+            n_text = self.vectorizer.n_features
+            self._w_text = w[:n_text].copy()
+            self._w_pop = float(w[n_text]) if w.size > n_text else 0.0
+            self._b = float(self.model.intercept_[0])
+            self._snap_version = self._fit_count
 
     def compute_feature_matrix(self, query: str, candidates: list, store):
-        texts = [f"{query} {cand}" for cand in candidates]
-        X_text = self.vectorizer.transform(texts)
-        pops = []
-        for cand in candidates:
-            score = store.get_popularity(cand) or 0.0
-            pops.append([np.log1p(score)])
-        pops_sparse = sparse.csr_matrix(np.array(pops, dtype=np.float32))
+        X_text = self._text_matrix(query, candidates, store)
+        pops_sparse = sparse.csr_matrix(self._pop_column(candidates, store).reshape(-1, 1))
         X = sparse.hstack([X_text, pops_sparse], format='csr')
         return X
 
-    def score_candidates(self, query: str, candidates: list, store):
-        if not candidates:
+    def score_candidates(self, query: str, candidates: list, store, k: int = None):
+        """Score candidates and return (candidate, score) pairs, best first;
+        k limits the result to the top k without fully sorting the rest."""
+        if not candidates or (k is not None and k <= 0):
             return []
-        X = self.compute_feature_matrix(query, candidates, store)
         try:
-            scores = self.model.decision_function(X)
+            # decision_function computed by hand: X @ w + b with the feature
+            # blocks scored separately, never materializing the joined matrix
+            self._refresh_weights()
+            X_text = self._text_matrix(query, candidates, store)
+            pops = self._pop_column(candidates, store)
+            scores = X_text.dot(self._w_text) + pops * self._w_pop + self._b
         except Exception:
             scores = np.zeros(len(candidates))
-        pairs = list(zip(candidates, scores))
-        pairs.sort(key=lambda x: x[1], reverse=True)
-        return pairs
+        if k is None or k >= len(candidates):
+            idx = np.argsort(-scores)
+        else:
+            # O(N) partition to isolate the top k, then sort just those
+            idx = np.argpartition(-scores, k - 1)[:k]
+            idx = idx[np.argsort(-scores[idx])]
+        return [(candidates[i], float(scores[i])) for i in idx]
 
     def partial_fit(self, X, y):
         self.model.partial_fit(X, y, classes=np.array([0, 1]))
+        self._fit_count += 1
 
     def save(self, path):
         # lightweight saving using joblib can be added if desired
-        pass
\ No newline at end of file
+        pass
@@ -1,37 +1,119 @@
-# Simple in-memory store that keeps a popularity counter and a sorted list of queries for prefix lookup.
+# Simple in-memory store that keeps a popularity counter and a pruning radix trie for prefix lookup.
 # This is NOT persistent and intended only for dev/testing.
 
-from bisect import bisect_left, bisect_right, insort
+import heapq
+import sys
 from collections import Counter
+from operator import itemgetter
+
+TOP_CACHE_SIZE = 50
+
+
+class _TrieNode:
+    __slots__ = ('children', 'is_word', 'rank', 'max_child_rank')
 
-class InMemoryStore:
     def __init__(self):
+        self.children = {}        # char -> _TrieNode
+        self.is_word = False
+        self.rank = 0             # popularity of the word ending here (if is_word)
+        self.max_child_rank = 0   # max rank anywhere in this subtree (incl. self)
+
+
+class PruningRadixTrie:
+    """Trie that stores the max rank of each subtree, so top-k prefix queries
+    can walk branches best-first and prune whole subtrees early instead of
+    scanning every match."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, word: str, rank: int):
+        # walk/create the path, then propagate the (only ever increasing) rank up
+        node = self.root
+        path = [node]
+        for ch in word:
+            nxt = node.children.get(ch)
+            if nxt is None:
+                nxt = _TrieNode()
+                node.children[ch] = nxt
+            node = nxt
+            path.append(node)
+        node.is_word = True
+        node.rank = rank
+        for n in path:
+            if rank > n.max_child_rank:
+                n.max_child_rank = rank
+
+    def top_k(self, prefix: str, k: int):
+        """Return up to k (word, rank) pairs under prefix, best rank first."""
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        # best-first search: heap entries are (-rank, word, kind, node) where
+        # kind 0 = finalized word (its rank beats everything left in the heap),
+        # kind 1 = unexplored subtree keyed on its max_child_rank
+        results = []
+        heap = [(-node.max_child_rank, prefix, 1, node)]
+        while heap and len(results) < k:
+            neg_rank, word, kind, n = heapq.heappop(heap)
+            if kind == 0:
+                results.append((word, -neg_rank))
+                continue
+            if n.is_word:
+                heapq.heappush(heap, (-n.rank, word, 0, n))
+            for ch, child in n.children.items():
+                heapq.heappush(heap, (-child.max_child_rank, word + ch, 1, child))
+        return results
+
+
+class InMemoryStore:
+    def __init__(self, vectorizer=None):
         self.pop = Counter()           # query -> score
-        self.sorted_queries = []       # sorted unique queries for lexicographic prefix search
+        self.trie = PruningRadixTrie() # rank-aware prefix index over the same queries
+        # optional stateless vectorizer (e.g. OnlineModel.vectorizer); when set,
+        # each query's feature row is hashed once at insertion and reused by
+        # every scoring request instead of being re-tokenized per request
+        self.vectorizer = vectorizer
+        self.vec_row = {}              # query -> 1xD csr row
+        # cached top queries sorted by score desc, rebuilt lazily on read;
+        # avoids a full Counter scan on every empty-prefix request
+        self.top_cache = []            # list of (query, score)
+        self.top_dirty = True
 
     def add_query(self, query: str, increment: int = 1):
-        # normalize minimally
-        q = query.strip().lower()
-        if q not in self.pop:
-            # insert into sorted list
-            insort(self.sorted_queries, q)
+        # normalize minimally; interning makes the hot dict lookups pointer
+        # comparisons since the same key strings recur constantly
+        q = sys.intern(query.strip().lower())
         if increment:
             self.pop[q] += increment
+        elif q not in self.pop:
+            self.pop[q] = 0
+        self.trie.insert(q, self.pop[q])
+        if self.vectorizer is not None and q not in self.vec_row:
+            self.vec_row[q] = self.vectorizer.transform([q])
+        # most increments leave the top-N unchanged; only mark the cache stale
+        # when this query could now belong in it
+        if increment and not self.top_dirty:
+            if len(self.top_cache) < TOP_CACHE_SIZE or self.pop[q] >= self.top_cache[-1][1]:
+                self.top_dirty = True
 
     def get_top_n(self, limit=10):
-        return [q for q, _ in self.pop.most_common(limit)]
+        if limit > TOP_CACHE_SIZE:
+            return [q for q, _ in self.pop.most_common(limit)]
+        if self.top_dirty:
+            self.top_cache = heapq.nlargest(TOP_CACHE_SIZE, self.pop.items(), key=itemgetter(1))
+            self.top_dirty = False
+        return [q for q, _ in self.top_cache[:limit]]
 
     def get_prefix_candidates(self, prefix: str, limit=50):
         if not prefix:
             return self.get_top_n(limit)
         p = prefix.strip().lower()
-        # lexicographic range via bisect
-        lo = bisect_left(self.sorted_queries, p)
-        hi = bisect_right(self.sorted_queries, p + chr(0xff))
-        results = self.sorted_queries[lo:hi]
-        # sort results by popularity descending while keeping a deterministic order
-        results.sort(key=lambda x: (-self.pop.get(x, 0), x))
-        return results[:limit]
+        return [q for q, _ in self.trie.top_k(p, limit)]
 
     def get_popularity(self, query: str):
-        return float(self.pop.get(query.strip().lower(), 0.0))
\ No newline at end of file
+        # expects an already-normalized query; callers normalize raw input once
+        # at the API boundary instead of re-normalizing per lookup
+        return float(self.pop.get(query, 0.0))
@@ -1,70 +1,108 @@
-# Background trainer using an in-memory deque as an event queue.
+# Background trainer driven by an asyncio.Queue on the server's event loop.
 # Provides enqueue_event and start_trainer(store, model).
 
-import threading
+import asyncio
 import time
-from collections import deque
 from scipy import sparse
 import numpy as np
 
-EVENT_QUEUE = deque()
-_stop = False
+EVENT_QUEUE: asyncio.Queue = asyncio.Queue()
+
+# reusable scratch for the popularity column; only one batch is fitted at a
+# time, so the buffer is grown on demand and reused across flushes
+_pop_buf = np.empty(1024, dtype=np.float32)
+
 
 def enqueue_event(ev: dict):
-    EVENT_QUEUE.append(ev)
+    EVENT_QUEUE.put_nowait(ev)
+
+
+def _ensure_pop_buf(n: int):
+    global _pop_buf
+    if _pop_buf.size < n:
+        _pop_buf = np.empty(max(n, _pop_buf.size * 2), dtype=np.float32)
+    return _pop_buf[:n]
+
+
+def _append_column(X, col):
+    """Append a dense column to a CSR matrix in one pass: each row gains one
+    trailing entry, so the joined indices/data arrays are built directly
+    instead of via an intermediate (N,1) CSR and sparse.hstack."""
+    n, d = X.shape
+    indptr = X.indptr + np.arange(n + 1, dtype=X.indptr.dtype)
+    indices = np.insert(X.indices, X.indptr[1:], d)
+    data = np.insert(X.data, X.indptr[1:], col)
+    return sparse.csr_matrix((data, indices, indptr), shape=(n, d + 1))
+
+
+def _fit_batch(store, model, batch, seen_positive):
+    """Fit one event batch; returns whether a positive label has been seen yet."""
+    pairs = []  # (query, candidate) kept as-is so nothing has to be re-split later
+    labels = []
+    for ev in batch:
+        if ev.get('type') == 'impression':
+            q = ev.get('query', '')
+            cand_list = ev.get('candidates', [])
+            clicked = ev.get('clicked')
+            for cand in cand_list:
+                pairs.append((q, cand))
+                labels.append(1 if clicked and cand == clicked else 0)
+        elif ev.get('type') == 'click':
+            q = ev.get('query', '')
+            pairs.append((q, ev.get('candidate')))
+            labels.append(1)
+    if not pairs:
+        return seen_positive
+    has_positive = any(labels)
+    if not has_positive and not seen_positive:
+        # all-negative batch before the model has ever seen a click carries
+        # no gradient information; skip the partial_fit call overhead
+        return seen_positive
+    X_text = model.vectorizer.transform([f"{q} {c}" for q, c in pairs])
+    scores = np.fromiter((store.pop.get((c or '').strip().lower(), 0) for _, c in pairs),
+                         dtype=np.float32, count=len(pairs))
+    pops = _ensure_pop_buf(len(pairs))
+    np.log1p(scores, out=pops)
+    X = _append_column(X_text, pops)
+    y = np.array(labels)
+    try:
+        model.partial_fit(X, y)
+    except Exception as e:
+        print('partial_fit error:', e)
+    return seen_positive or has_positive
+
+
+async def _train_loop(store, model, batch_size, max_wait_ms, save_every):
+    last_saved = time.time()
+    seen_positive = False
+    print('Trainer started (asyncio)')
+    while True:
+        try:
+            # sleep until the first event arrives, then accumulate until the
+            # batch fills up or max_wait_ms elapses, so partial_fit overhead
+            # is amortized across more samples under light load
+            batch = [await EVENT_QUEUE.get()]
+            deadline = time.monotonic() + max_wait_ms / 1000.0
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(EVENT_QUEUE.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # sklearn work is CPU-bound; keep it off the event loop
+            seen_positive = await asyncio.to_thread(_fit_batch, store, model, batch, seen_positive)
+            # simple periodic save hook (no-op)
+            if time.time() - last_saved >= save_every:
+                last_saved = time.time()
+        except asyncio.CancelledError:
+            print('Trainer stopped')
+            raise
+        except Exception as e:
+            print('Trainer loop exception:', e)
 
-def start_trainer(store, model, batch_size=256, save_every=60):
-    def _loop():
-        nonlocal store, model
-        last_saved = time.time()
-        batch = []
-        print('Trainer started (in-memory)')
-        while not _stop:
-            try:
-                # gather events up to batch_size or wait briefly
-                while EVENT_QUEUE and len(batch) < batch_size:
-                    batch.append(EVENT_QUEUE.popleft())
-                if batch:
-                    X_texts = []
-                    labels = []
-                    for ev in batch:
-                        if ev.get('type') == 'impression':
-                            q = ev.get('query', '')
-                            cand_list = ev.get('candidates', [])
-                            clicked = ev.get('clicked')
-                            for cand in cand_list:
-                                X_texts.append(f"{q} {cand}")
-                                labels.append(1 if clicked and cand == clicked else 0)
-                        elif ev.get('type') == 'click':
-                            q = ev.get('query', '')
-                            cand = ev.get('candidate')
-                            X_texts.append(f"{q} {cand}")
-                            labels.append(1)
-                    if X_texts:
-                        X_text = model.vectorizer.transform(X_texts)
-                        pops = []
-                        for txt in X_texts:
-                            cand = txt.split(' ', 1)[1] if ' ' in txt else txt
-                            score = store.get_popularity(cand) or 0.0
-                            pops.append([np.log1p(score)])
-                        pops_arr = np.array(pops, dtype=np.float32)
-                        pops_sparse = sparse.csr_matrix(pops_arr)
-                        X = sparse.hstack([X_text, pops_sparse], format='csr')
-                        y = np.array(labels)
-                        try:
-                            model.partial_fit(X, y)
-                        except Exception as e:
-                            print('partial_fit error:', e)
-                    batch = []
-                else:
-                    time.sleep(0.5)
-                # simple periodic save hook (no-op)
-                if time.time() - last_saved >= save_every:
-                    last_saved = time.time()
-            except Exception as e:
-                print('Trainer loop exception:', e)
-        print('Trainer stopped')
 
-    t = threading.Thread(target=_loop, daemon=True)
-    t.start()
-    return t
\ No newline at end of file
+def start_trainer(store, model, batch_size=256, max_wait_ms=50, save_every=60):
+    # must be called with a running event loop (e.g. FastAPI startup)
+    return asyncio.create_task(_train_loop(store, model, batch_size, max_wait_ms, save_every))